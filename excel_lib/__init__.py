@@ -1 +1 @@
-from .excel_file import ExcelFile, file_to_io_stream, is_match
+from .excel_file import ExcelFile, file_to_io_stream, is_match, normalize_key
\ No newline at end of file
@@ -1,6 +1,29 @@
+import bisect
+import numpy as np
 import pandas as pd
 import io
+import os
 import zipfile
+import xml.etree.ElementTree as ET
+
+try:
+    import python_calamine  # noqa: F401 - enables pandas' Rust-based "calamine" reader
+    # pandas only knows the "calamine" engine from 2.2 on
+    EXCEL_ENGINE = "calamine" if tuple(int(part) for part in pd.__version__.split(".")[:2]) >= (2, 2) else None
+except ImportError:
+    EXCEL_ENGINE = None  # Let pandas pick its default reader (openpyxl)
+
+SPREADSHEET_DRAWING_NS = "{http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing}"
+TWO_CELL_ANCHOR = SPREADSHEET_DRAWING_NS + "twoCellAnchor"
+ONE_CELL_ANCHOR = SPREADSHEET_DRAWING_NS + "oneCellAnchor"
+ABSOLUTE_ANCHOR = SPREADSHEET_DRAWING_NS + "absoluteAnchor"
+
+# Takeover sections of the template and the sections_config entries holding their section names
+TAKEOVER_SECTION_CONFIG_KEYS = {
+    "global_data": "SECTION_STATION_TAKEOVER_DIVIDER",
+    "contact_person": "SECTION_CONTACT_PERSON",
+    "responsible_person": "SECTION_RESPONSIBLE_PERSON"
+}
 
 def file_to_io_stream(path):
     with open(path, "rb") as file:
@@ -13,57 +36,135 @@ def is_match(value1, value2):
         return value1.strip() == value2.strip()
     return value1 == value2
 
+def normalize_key(value):
+    """Strips strings and leaves other values unchanged, so that equal keys compare and hash equally.
+
+    Two values match according to is_match exactly when their normalized forms are equal.
+    """
+    return value.strip() if isinstance(value, str) else value
+
 class ExcelFile:
     def __init__(self, file_stream, sections_config):
-        """Initializes the ExcelFile class, validates the file, and checks for non-cell objects."""
+        """Initializes the ExcelFile class, validates the file, and checks for non-cell objects.
+
+        Args:
+            file_stream (file-like, str or os.PathLike): binary stream of the workbook, or a path to it.
+                A path is read directly from disk, without copying the file into memory first.
+            sections_config (dict): section names used to find takeover sections
+        """
         self.sections_config = sections_config
+        # Configured section names, stripped once and kept in config order.
+        # A missing config or entry means no names; non-string names can never match a section header.
+        self._takeover_section_names = {
+            takeover_key: tuple(
+                name.strip() for name in (sections_config or {}).get(config_key) or []
+                if isinstance(name, str)
+            )
+            for takeover_key, config_key in TAKEOVER_SECTION_CONFIG_KEYS.items()
+        }
         self.worksheet_count = 0
+        self._sheet_names = []
         self.worksheet = None
+        self._values = None
         self.identified_sections = None
-        self._validate_excel_file(file_stream)
-        self.non_cell_objects = self._check_for_non_cell_objects(file_stream)
+        self._key_index = None
+        if isinstance(file_stream, (str, os.PathLike)):
+            with open(file_stream, "rb") as file:
+                self._read_workbook(file)
+        else:
+            self._read_workbook(file_stream)
+
+    def _read_workbook(self, file_stream):
+        """Validates the workbook, collects non-cell objects and loads the first worksheet with its sections."""
+        self._inspect_archive(file_stream)
         self._load_first_worksheet(file_stream)  # Load only the first worksheet
-        self._identify_sections()
         self.identified_sections = self._identify_sections()
 
-    def _validate_excel_file(self, file_stream):
-        """Validates if the file is a correct Excel (.xlsx) file."""
+    def _inspect_archive(self, file_stream):
+        """Opens the file as a ZIP archive once to validate it, read its sheet names and collect non-cell objects."""
         file_stream.seek(0)  # Ensure stream starts at the beginning
         try:
             with zipfile.ZipFile(file_stream, 'r') as zip_ref:
-                if "xl/workbook.xml" not in zip_ref.namelist():
-                    raise ValueError("Invalid Excel file: missing xl/workbook.xml")
+                self._validate_excel_file(zip_ref)
+                self._sheet_names = self._read_sheet_names(zip_ref)
+                self.worksheet_count = len(self._sheet_names)
+                self.non_cell_objects = self._check_for_non_cell_objects(zip_ref)
         except zipfile.BadZipFile:
             raise ValueError("Invalid Excel file: unable to open as ZIP archive")
 
-    def _check_for_non_cell_objects(self, file_stream):
-        """Extracts images and chart references from an Excel file."""
+    def _validate_excel_file(self, zip_ref):
+        """Validates if the archive is a correct Excel (.xlsx) file."""
+        try:
+            zip_ref.getinfo("xl/workbook.xml")  # Dict lookup instead of a scan over namelist()
+        except KeyError:
+            raise ValueError("Invalid Excel file: missing xl/workbook.xml")
+
+    def _read_sheet_names(self, zip_ref):
+        """Reads sheet names in workbook order from xl/workbook.xml.
+
+        Returns:
+            list: names of all sheets, the first one being the sheet that gets loaded
+        """
+        with zip_ref.open("xl/workbook.xml") as f:
+            return [
+                element.get("name")
+                for _, element in ET.iterparse(f)
+                if element.tag.endswith("}sheet")  # Namespace differs between transitional and strict files
+            ]
+
+    def _check_for_non_cell_objects(self, zip_ref):
+        """Extracts images and chart references from an opened Excel archive."""
         non_cell_objects = []
-        file_stream.seek(0)  # Ensure the stream is at the beginning
-        with zipfile.ZipFile(file_stream, 'r') as zip_ref:
-            # Check for media files (images)
-            media_files = [f for f in zip_ref.namelist() if f.startswith("xl/media/")]
-            for media_file in media_files:
-                non_cell_objects.append(f"Image found: {media_file}")
-            # Check for drawings
-            drawing_files = [f for f in zip_ref.namelist() if f.startswith("xl/drawings/drawing")]
-            for drawing_file in drawing_files:
-                with zip_ref.open(drawing_file) as f:
-                    content = f.read().decode("utf-8")
-                    if "<xdr:twoCellAnchor>" in content:
-                        non_cell_objects.append(f"Image anchored in {drawing_file}")
-                    elif "<xdr:absoluteAnchor>" in content:
-                        non_cell_objects.append(f"Image not anchored in {drawing_file}")
+        drawing_files = []
+        # Sort media files (images) and drawings in a single pass over the archive names
+        for name in zip_ref.namelist():
+            if name.startswith("xl/media/"):
+                non_cell_objects.append(f"Image found: {name}")
+            elif name.startswith("xl/drawings/drawing"):
+                drawing_files.append(name)
+        # Check drawings after all media, keeping media entries first in the result
+        for drawing_file in drawing_files:
+            anchor = self._find_drawing_anchor(zip_ref, drawing_file)
+            if anchor in (TWO_CELL_ANCHOR, ONE_CELL_ANCHOR):
+                non_cell_objects.append(f"Image anchored in {drawing_file}")
+            elif anchor == ABSOLUTE_ANCHOR:
+                non_cell_objects.append(f"Image not anchored in {drawing_file}")
         return non_cell_objects
 
+    def _find_drawing_anchor(self, zip_ref, drawing_file):
+        """Streams a drawing part and returns its anchor type, stopping at the first cell anchor.
+
+        Anchors are recognized by element tag, whatever attributes they carry (Excel writes
+        <xdr:twoCellAnchor editAs="oneCell">). In a drawing part that is not well-formed XML,
+        only the anchors before the first error are taken into account.
+
+        Returns:
+            str or None: TWO_CELL_ANCHOR or ONE_CELL_ANCHOR for the first object anchored to cells,
+            ABSOLUTE_ANCHOR if objects are only placed absolutely, None if there are no such anchors
+        """
+        anchor = None
+        with zip_ref.open(drawing_file) as f:
+            try:
+                for event, element in ET.iterparse(f, events=("start", "end")):
+                    if event == "end":
+                        element.clear()  # Drop finished subtrees so the drawing is never held in memory as a whole
+                    elif element.tag in (TWO_CELL_ANCHOR, ONE_CELL_ANCHOR):
+                        return element.tag
+                    elif element.tag == ABSOLUTE_ANCHOR:
+                        anchor = ABSOLUTE_ANCHOR
+            except ET.ParseError:
+                pass  # Keep what was found before the malformed part
+        return anchor
+
     def _load_first_worksheet(self, file_stream):
         """Loads only the first worksheet and warns if there are multiple sheets."""
         file_stream.seek(0)  # Reset stream position
-        excel_file = pd.ExcelFile(file_stream)
-        self.worksheet_count = len(excel_file.sheet_names)  # Get sheet count
+        # Sheet names were already read from the archive, so pandas only has to parse the sheet itself
         if self.worksheet_count > 1:
             print(f"Warning: The Excel file contains {self.worksheet_count} sheets. Only the first sheet will be used.")
-        self.worksheet = pd.read_excel(file_stream, sheet_name=excel_file.sheet_names[0])
+        self.worksheet = pd.read_excel(file_stream, sheet_name=0, engine=EXCEL_ENGINE)
+        # Plain numpy view for cell access; pandas indexers are far slower per cell
+        self._values = self.worksheet.to_numpy()
 
     def find_row_for_key(self, key, section_name=None):
         """
@@ -83,10 +184,9 @@ class ExcelFile:
             ValueError: If multiple matches are found within the specified section.
         """
         # Find all matching indices
-        matching_indices = [
-            row_index for row_index, value in self.worksheet.iloc[:, 1].items()
-            if pd.notna(value) and is_match(value, key)
-        ]
+        if self._key_index is None:
+            self._key_index = self._build_key_index()
+        matching_indices = self._key_index.get(normalize_key(key), [])
 
         if not matching_indices:
             return -1  # No matches found
@@ -94,17 +194,10 @@ class ExcelFile:
         if len(matching_indices) == 1:
             return matching_indices[0]  # Single match in the entire worksheet
 
-        section_keys = {
-            "global_data": self.sections_config.get("SECTION_STATION_TAKEOVER_DIVIDER", []),
-            "contact_person": self.sections_config.get("SECTION_CONTACT_PERSON", []),
-            "responsible_person": self.sections_config.get("SECTION_RESPONSIBLE_PERSON", [])
-        }
-
-        if section_name in section_keys:
-            matching_section = next((name for name in section_keys[section_name] 
-                           if self.identified_sections and name in self.identified_sections), None)
-            print(f"Matching section for '{section_name}': {matching_section}")
-            print(f"OLD Identified sections: {section_keys[section_name][0]}")
+        # Section names are stored stripped, so the query is normalized the same way as keys
+        section_name = normalize_key(section_name)
+        if section_name in TAKEOVER_SECTION_CONFIG_KEYS:
+            matching_section = self._find_takeover_section(section_name, self.identified_sections or {})
             if matching_section:
                 section_name = matching_section
 
@@ -116,8 +209,10 @@ class ExcelFile:
                 return -1
 
             section_start, section_end = self.identified_sections[section_name]
-            # Filter matches by section range
-            section_matches = [index for index in matching_indices if section_start <= index <= section_end]
+            # Matches are sorted by row, so the ones inside the section range are found by binary search
+            first_match = bisect.bisect_left(matching_indices, section_start)
+            last_match = bisect.bisect_right(matching_indices, section_end)
+            section_matches = matching_indices[first_match:last_match]
 
             if len(section_matches) == 1:
                 return section_matches[0]  # Single match in the section
@@ -125,8 +220,19 @@ class ExcelFile:
                 raise ValueError(f"Multiple matches found for key '{key}' in section '{section_name}': {section_matches}")
             return -1  # No matches in the specified section
 
-        return matching_indices  # Return all matches if no section specified
+        return list(matching_indices)  # Return all matches if no section specified, as a copy of the index entry
 
+    def _build_key_index(self):
+        """Maps every value in the second column to the rows it appears in, so keys can be found without a scan.
+
+        Returns:
+            dict: stripped value -> list of row indices in ascending order
+        """
+        key_index = {}
+        keys = self._values[:, 1]
+        for row_index in np.flatnonzero(pd.notna(keys)).tolist():
+            key_index.setdefault(normalize_key(keys[row_index]), []).append(row_index)
+        return key_index
 
     def _identify_sections(self):
         """Identify sections based on first column in workbook
@@ -135,21 +241,62 @@ class ExcelFile:
             list: list of section names
         """
         sections = {}
+        first_column = self.worksheet.iloc[:, 0]
+        try:
+            # Non-string cells yield NaN, which eq(True) turns into False
+            is_header = first_column.str.isupper().eq(True).to_numpy(dtype=bool)
+        except AttributeError:
+            return sections  # Column holds no strings, so there are no section headers
+
+        # Only the header rows are visited in Python
+        header_rows = np.flatnonzero(is_header)
         current_section = None
-        for row_index, value in enumerate(self.worksheet.iloc[:, 0]):
-            if isinstance(value, str) and value.isupper():
-                if current_section:
-                    sections[current_section][1] = row_index -1
-                if isinstance(value, str) and isinstance(value, str):
-                    current_section = value.strip()
-                else:
-                    current_section = value
-                sections[current_section] = [row_index + 1, None]
+        for row_index, value in zip(header_rows.tolist(), self._values[header_rows, 0]):
+            if current_section:
+                sections[current_section][1] = row_index - 1
+            current_section = value.strip()
+            sections[current_section] = [row_index + 1, None]
 
         if current_section:
-            sections[current_section][1] = self.worksheet.iloc[:, 0].last_valid_index()
+            sections[current_section][1] = first_column.last_valid_index()
         return sections
     
+    def _find_takeover_section(self, takeover_key, sections):
+        """Returns the first configured name of a takeover section that is present in sections.
+
+        Args:
+            takeover_key (str): "global_data", "contact_person" or "responsible_person"
+            sections (dict): identified sections
+
+        Returns:
+            str or None: name of the matching section or None if none of the configured names is present
+        """
+        return next((name for name in self._takeover_section_names[takeover_key] if name in sections), None)
+
+    def _map_keys_to_rows(self, start, stop, numbered_only=True, strip_keys=False):
+        """Maps keys from the second column to their row indices for rows in range [start, stop).
+
+        Args:
+            start (int): first row of the range
+            stop (int): row after the last row of the range
+            numbered_only (bool): include only rows that also have a value in the first column
+            strip_keys (bool): strip whitespace from string keys
+
+        Returns:
+            dict: key -> row index, later rows overriding earlier ones for repeated keys
+        """
+        block = self.worksheet.iloc[start:stop, :2]
+        keys = block.iloc[:, 1]
+        mask = keys.notna()
+        if numbered_only:
+            mask = mask & block.iloc[:, 0].notna()
+        mask = mask.to_numpy()
+        rows = block.index[mask].tolist()
+        keys = keys[mask].tolist()
+        if strip_keys:
+            keys = [normalize_key(key) for key in keys]
+        return dict(zip(keys, rows))
+
     def create_template_structure(self):
         """Creates a template structure based on the Excel file."""
         template_structure = {
@@ -161,47 +308,26 @@ class ExcelFile:
             "stations": {}
         }
 
-        # Identify sections
-        sections = self._identify_sections()
-
-        # Dynamically retrieve section keys from self.sections_config
-        section_keys = {
-            "contact_person": self.sections_config.get("SECTION_CONTACT_PERSON", []),
-            "responsible_person": self.sections_config.get("SECTION_RESPONSIBLE_PERSON", [])
-        }
+        # Sections were already identified while loading the workbook
+        sections = self.identified_sections
 
-        takeover_divider_key = self.sections_config.get("SECTION_STATION_TAKEOVER_DIVIDER", [])
-        if takeover_divider_key:
-            divider = next((name.strip() for name in takeover_divider_key if name.strip() in sections), None)
-            if divider:
-                global_data = {}
-                for row_index, row in self.worksheet.iloc[:sections[divider][0]-1, :2].iterrows():
-                    value, key = row
-                    if pd.notna(key) and pd.notna(value):
-                        global_data[key] = row_index
-                template_structure["takeover"]["global_data"] = global_data
+        # Section names come from self.sections_config
+        divider = self._find_takeover_section("global_data", sections)
+        if divider:
+            template_structure["takeover"]["global_data"] = self._map_keys_to_rows(0, sections[divider][0]-1)
 
         # Populate takeover sections
-        for key, section_names in section_keys.items():
-            section_match = next((name for name in section_names if name in sections), None)
+        for key in ("contact_person", "responsible_person"):
+            section_match = self._find_takeover_section(key, sections)
             if section_match:
-                section_data = {}
-                for row_index, row in self.worksheet.iloc[sections[section_match][0]:sections[section_match][1]+2, :2].iterrows():
-                    value, key_name = row
-                    if pd.notna(key_name) and pd.notna(value):
-                        section_data[key_name] = row_index
-                template_structure["takeover"][key] = section_data
+                section_start, section_end = sections[section_match]
+                template_structure["takeover"][key] = self._map_keys_to_rows(section_start, section_end+2)
 
         # Populate stations
         for section, section_range in sections.items():
-            station_data = {}
-            for row_index in range(section_range[0], section_range[1]+1):
-                key = self.worksheet.iat[row_index, 1]
-                if pd.notna(key):
-                    if isinstance(key, str):
-                        key = key.strip()
-                    station_data[key] = row_index
-            template_structure["stations"][section] = station_data
+            template_structure["stations"][section] = self._map_keys_to_rows(
+                section_range[0], section_range[1]+1, numbered_only=False, strip_keys=True
+            )
 
         return template_structure
 
@@ -224,8 +350,8 @@ class ExcelFile:
         }
 
         def _update_rows_in_structure(self, data_section, name_of_the_section):
-            """Checks if the value is in the same row in file and in template.
-            Otherwise looks for that specific value in all rows, and if found then updates row number.
+            """Looks up the row of every key of the section in the file and updates the row number.
+            Keys that are not found get -1.
 
             Args:
                 data_section (dict or None): Section of whole data.
@@ -244,19 +370,13 @@ class ExcelFile:
                 )
 
             updated_section = {}
-            for key, expected_row in data_section.items():
-                actual_label = (
-                    self.worksheet.iloc[expected_row, 1] 
-                    if expected_row < len(self.worksheet) else None
-                )
+            for key in data_section:
+                # The indexed lookup gives the same answer whether or not the template row is still correct,
+                # so the row stored in the template does not need to be probed first
                 row_matches = self.find_row_for_key(key, name_of_the_section)
-
-                if pd.notna(actual_label) and is_match(actual_label, key) and isinstance(row_matches, int):
-                    updated_section[key] = row_matches
-                else:
-                    if isinstance(row_matches, list) and len(row_matches) > 1:
-                        raise ValueError(f"Multiple matches found for key '{key}': {row_matches}")
-                    updated_section[key] = row_matches if isinstance(row_matches, int) else -1
+                if isinstance(row_matches, list) and len(row_matches) > 1:
+                    raise ValueError(f"Multiple matches found for key '{key}': {row_matches}")
+                updated_section[key] = row_matches if isinstance(row_matches, int) else -1
 
             return updated_section
 
@@ -268,6 +388,40 @@ class ExcelFile:
 
         return updated_structure
 
+    def _plan_rows(self, fields):
+        """Splits a section of the template into field names and row positions ready for gathering.
+
+        Args:
+            fields (dict): field name -> row index, where -1 or out-of-range rows mean missing
+
+        Returns:
+            tuple: (field names, row indices, mask of rows that exist in the worksheet)
+        """
+        field_names = list(fields)
+        rows = np.fromiter(fields.values(), dtype=np.intp, count=len(field_names))
+        in_range = (rows >= 0) & (rows < len(self.worksheet))
+        return field_names, rows, in_range
+
+    @staticmethod
+    def _gather_values(plan, column_values):
+        """Reads all planned rows from one worksheet column, using None for rows outside the worksheet.
+
+        Args:
+            plan (tuple): result of _plan_rows
+            column_values (numpy.ndarray): values of a single worksheet column
+
+        Returns:
+            numpy.ndarray: object array with one value per planned field
+        """
+        field_names, rows, in_range = plan
+        gathered = np.full(len(field_names), None, dtype=object)
+        gathered[in_range] = column_values[rows[in_range]]
+        return gathered
+
+    def _gather_rows(self, plan, column_values):
+        """Same as _gather_values, but returns a dict of field name -> cell value."""
+        return dict(zip(plan[0], self._gather_values(plan, column_values).tolist()))
+
     def create_data_structure_from_template(self, template):
         """Gather data from file based on template and structurize them in one dict object
 
@@ -280,68 +434,65 @@ class ExcelFile:
         data_structure = self.compare_structure_with_file(template)
 
         collected_takeover_structures = []
+        # Groups keyed by their global data values, NaN normalized to None so empty cells compare equal
+        groups_by_global_data = {}
+
+        # Resolve template rows once; each column is then read with a single gather per section
+        values = self._values
+        global_data_plan = self._plan_rows(data_structure["takeover"]["global_data"] or {})
+        contact_person_plan = self._plan_rows(data_structure["takeover"]["contact_person"] or {})
+        responsible_person_plan = self._plan_rows(data_structure["takeover"]["responsible_person"] or {})
+        station_plans = {
+            section: self._plan_rows(fields)
+            for section, fields in data_structure["stations"].items()
+            if fields is not None  # Skip sections with None fields
+        }
 
         for column in range(2, self.worksheet.shape[1]):
             # Take global data from column
-            global_data_section = data_structure["takeover"]["global_data"] or {}
-            current_global_data = {
-                key: self.worksheet.iloc[row, column] if row >= 0 and row < len(self.worksheet) else None 
-                for key, row in global_data_section.items()
-            }
+            column_values = values[:, column]
+            global_values = self._gather_values(global_data_plan, column_values)
 
-            # Skip columns where all values are None
-            if all(pd.isna(value) for value in current_global_data.values()):
+            # Skip columns where all values are None, checked on the whole array at once
+            if pd.isna(global_values).all():
                 continue
+            current_global_data = dict(zip(global_data_plan[0], global_values.tolist()))
 
             # Check whether there is a struct with this global data
-            matching_group = None
-            for group in collected_takeover_structures:
-                if group["global_data"] == current_global_data:
-                    matching_group = group
-                    break
+            group_key = tuple(None if pd.isna(value) else value for value in current_global_data.values())
+            matching_group = groups_by_global_data.get(group_key)
 
             # If there is none, create new one
-            if not matching_group:
+            if matching_group is None:
                 matching_group = {
                     "global_data": current_global_data,
                     "contact_person": None,
                     "responsible_person": None,
                     "stations": []
                 }
+                groups_by_global_data[group_key] = matching_group
                 collected_takeover_structures.append(matching_group)
 
             # Compare contact person - add fallback for None
-            contact_person_section = data_structure["takeover"]["contact_person"] or {}
-            current_contact_person = {
-                key: self.worksheet.iloc[row, column] if row >= 0 and row < len(self.worksheet) else None 
-                for key, row in contact_person_section.items()
-            }
+            current_contact_person = self._gather_rows(contact_person_plan, column_values)
             if matching_group["contact_person"] is None:
                 matching_group["contact_person"] = current_contact_person
             elif matching_group["contact_person"] != current_contact_person:
                 matching_group["contact_person"] = "Dla każdej stacji inna"
 
             # Compare responsible person - add fallback for None
-            responsible_person_section = data_structure["takeover"]["responsible_person"] or {}
-            current_responsible_person = {
-                key: self.worksheet.iloc[row, column] if row >= 0 and row < len(self.worksheet) else None 
-                for key, row in responsible_person_section.items()
-            }
+            current_responsible_person = self._gather_rows(responsible_person_plan, column_values)
             if matching_group["responsible_person"] is None:
                 matching_group["responsible_person"] = current_responsible_person
             elif matching_group["responsible_person"] != current_responsible_person:
                 matching_group["responsible_person"] = "Dla każdej stacji inna"
 
             # Add station data - ensure each section and fields are properly handled
-            station_data = {}
-            for section, fields in data_structure["stations"].items():
-                if fields is not None:  # Skip sections with None fields
-                    section_data = {
-                        field: self.worksheet.iloc[row, column] if row >= 0 and row < len(self.worksheet) else None
-                        for field, row in fields.items()
-                    }
-                    station_data[section] = section_data
-            
+            station_data = {
+                section: self._gather_rows(plan, column_values)
+                for section, plan in station_plans.items()
+            }
+
             matching_group["stations"].append(station_data)
 
         return collected_takeover_structures
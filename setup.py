@@ -5,9 +5,14 @@ setup(
     version="1.3.5",
     packages=find_packages(),
     install_requires=[
+        "numpy>=1.17.0",
         "openpyxl>=3.0.0",
         "pandas>=1.0.0",
     ],
+    extras_require={
+        # Faster workbook parsing; the calamine engine needs pandas 2.2 or newer
+        "calamine": ["python-calamine>=0.1.7", "pandas>=2.2.0"],
+    },
     description="Library for working with Excel files using pandas and openpyxl",
     author="Patryk Skibniewski",
     author_email="patrykski07@gmail.com",
@@ -1,6 +1,9 @@
 import pytest
 import pandas as pd
+import openpyxl
 import io
+import zipfile
+from functools import lru_cache
 from excel_lib.excel_file import ExcelFile
 
 # Global config for section names used in tests.
@@ -13,33 +16,146 @@ SECTIONS_CONFIG = {
 # ----------------------------
 # Fixtures for loading Excel files.
 # ----------------------------
+@lru_cache(maxsize=None)
+def read_test_file(file_name):
+    """Reads a file from the test directory once per session."""
+    with open(f"tests/files/{file_name}", "rb") as f:
+        return f.read()
+
+def write_xlsx(columns, target):
+    """Writes columns (name -> list of cell values) as the rows of a single-sheet workbook.
+
+    Rows are streamed into a write-only openpyxl workbook, which is much cheaper than
+    building a DataFrame only to call to_excel. target is a path or a binary stream.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    worksheet = workbook.create_sheet()
+    for row in zip(*columns.values()):
+        worksheet.append(row)
+    workbook.save(target)
+
 @pytest.fixture
 def load_excel_file(request):
     """Loads a real Excel file from the test directory."""
-    file_name = request.param
-    file_path = f"tests/files/{file_name}"
-    with open(file_path, "rb") as f:
-        file_stream = io.BytesIO(f.read())
-    return file_stream
+    # Fresh stream per test so the read position is never shared
+    return io.BytesIO(read_test_file(request.param))
+
+# Real file tests: one parametrized test checks the sheet count and non-cell objects of every test file
+@pytest.mark.parametrize("load_excel_file, worksheet_count, non_cell_objects", [
+    ("valid.xlsx", 1, []),
+    ("Terminale_normal.xlsx", 1, []),
+    ("multiple_sheets.xlsx", 4, []),
+    ("image_in_cell.xlsx", 1, ["Image found: xl/media/image1.png"]),
+    ("2_image_in_cells.xlsx", 1, [
+        "Image found: xl/media/image1.png",
+        "Image found: xl/media/image2.png"
+    ]),
+    ("3_image_in_cells_one_far.xlsx", 1, [
+        "Image found: xl/media/image1.png",
+        "Image found: xl/media/image2.png",
+        "Image found: xl/media/image3.png"
+    ]),
+    # An image placed over the sheet is reported together with its cell-anchored drawing
+    ("image_outside_cell.xlsx", 1, [
+        "Image found: xl/media/image1.png",
+        "Image anchored in xl/drawings/drawing1.xml"
+    ]),
+    ("image_in_and_outside_cell.xlsx", 1, [
+        "Image found: xl/media/image1.png",
+        "Image found: xl/media/image2.png",
+        "Image anchored in xl/drawings/drawing1.xml"
+    ]),
+    ("all_in_one.xlsx", 4, [
+        "Image found: xl/media/image1.png",
+        "Image found: xl/media/image2.png",
+        "Image found: xl/media/image3.png",
+        "Image anchored in xl/drawings/drawing2.xml",
+        "Image anchored in xl/drawings/drawing3.xml",
+        "Image anchored in xl/drawings/drawing1.xml"
+    ]),
+], indirect=["load_excel_file"])
+def test_file_expectations(load_excel_file, worksheet_count, non_cell_objects):
+    """Test that each real Excel file loads with the expected sheet count and non-cell objects."""
+    excel = ExcelFile(load_excel_file, SECTIONS_CONFIG)
+    assert excel.worksheet_count == worksheet_count
+    assert excel.non_cell_objects == non_cell_objects
 
-# Example real file tests (use parametrization to load different files)
-@pytest.mark.parametrize("load_excel_file", ["valid.xlsx"], indirect=True)
-def test_valid_excel(load_excel_file):
-    """Test a valid Excel file loads correctly and no non-cell objects are detected."""
+@pytest.mark.parametrize("load_excel_file", ["multiple_sheets.xlsx"], indirect=True)
+def test_multiple_sheets(load_excel_file):
+    """Test that only the first sheet is loaded when the file has several."""
     excel = ExcelFile(load_excel_file, SECTIONS_CONFIG)
-    assert excel.worksheet_count == 1
-    assert not excel.non_cell_objects, "No non-cell objects should be detected."
+    pd.testing.assert_frame_equal(excel.worksheet, pd.read_excel("tests/files/multiple_sheets.xlsx", sheet_name=0))
+
+@pytest.mark.parametrize("load_excel_file", ["valid.xlsx"], indirect=True)
+def test_excel_from_path(load_excel_file):
+    """Test that a path to the file gives the same result as a binary stream."""
+    excel_from_stream = ExcelFile(load_excel_file, SECTIONS_CONFIG)
+    excel_from_path = ExcelFile("tests/files/valid.xlsx", SECTIONS_CONFIG)
+    assert excel_from_path.worksheet_count == excel_from_stream.worksheet_count
+    assert excel_from_path.identified_sections == excel_from_stream.identified_sections
+    pd.testing.assert_frame_equal(excel_from_path.worksheet, excel_from_stream.worksheet)
+
+def add_drawing(file_stream, content):
+    """Adds a drawing part with the given content to an in-memory workbook."""
+    with zipfile.ZipFile(file_stream, "a") as zip_ref:
+        zip_ref.writestr("xl/drawings/drawing1.xml", content)
+    return file_stream
+
+@pytest.mark.parametrize("anchor, expected", [
+    ("twoCellAnchor", "Image anchored in xl/drawings/drawing1.xml"),
+    ('twoCellAnchor editAs="oneCell"', "Image anchored in xl/drawings/drawing1.xml"),
+    ("oneCellAnchor", "Image anchored in xl/drawings/drawing1.xml"),
+    ("absoluteAnchor", "Image not anchored in xl/drawings/drawing1.xml"),
+])
+def test_drawing_anchor_types(anchor, expected):
+    """Test that images anchored to one or two cells count as anchored, unlike absolutely placed ones."""
+    tag = anchor.split()[0]
+    file_stream = add_drawing(
+        io.BytesIO(read_test_file("valid.xlsx")),
+        '<xdr:wsDr xmlns:xdr="http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing">'
+        f'<xdr:{anchor}><xdr:clientData/></xdr:{tag}></xdr:wsDr>'
+    )
+    excel = ExcelFile(file_stream, SECTIONS_CONFIG)
+    assert excel.non_cell_objects == [expected]
+
+@pytest.mark.parametrize("content, expected", [
+    ("", []),
+    ("<garbage", []),
+    ("<xdr:wsDr><xdr:twoCellAnchor>", []),
+    (
+        '<xdr:wsDr xmlns:xdr="http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing">'
+        "<xdr:absoluteAnchor><garbage",
+        ["Image not anchored in xl/drawings/drawing1.xml"]
+    ),
+])
+def test_malformed_drawing(content, expected):
+    """Test that a drawing part which is not valid XML only reports anchors found before the error."""
+    file_stream = add_drawing(io.BytesIO(read_test_file("valid.xlsx")), content)
+    excel = ExcelFile(file_stream, SECTIONS_CONFIG)
+    assert excel.non_cell_objects == expected
+
+def test_invalid_zip_file():
+    """Test that a stream which is not a ZIP archive is rejected."""
+    with pytest.raises(ValueError, match="unable to open as ZIP archive"):
+        ExcelFile(io.BytesIO(b"not an excel file"), SECTIONS_CONFIG)
+
+def test_zip_without_workbook():
+    """Test that a ZIP archive without xl/workbook.xml is rejected."""
+    file_stream = io.BytesIO()
+    with zipfile.ZipFile(file_stream, "w") as zip_ref:
+        zip_ref.writestr("readme.txt", "not a workbook")
+    with pytest.raises(ValueError, match="missing xl/workbook.xml"):
+        ExcelFile(file_stream, SECTIONS_CONFIG)
 
 # More real file tests can be added similarly, ensuring images and multiple sheets are handled correctly.
 # -------------------------------------------------------------------------------------------
 # Fixtures and helper functions for in-memory Excel with sections.
 # The fixture below creates an in-memory Excel file used for many tests.
 # -------------------------------------------------------------------------------------------
-@pytest.fixture
-def sample_excel_with_sections():
-    """Creates an in-memory Excel file with multiple sections for testing _identify_sections."""
-    output = io.BytesIO()
-    df = pd.DataFrame({
+@pytest.fixture(scope="module")
+def sample_excel_with_sections_bytes():
+    """Creates the content of an Excel file with multiple sections for testing _identify_sections."""
+    columns = {
         "A": [
             "liczba",
             1,  # Initial numbering
@@ -113,32 +229,39 @@ def sample_excel_with_sections():
             "Test Value 4",
             "Test Value 5"
         ]
-    })
-    df.to_excel(output, index=False, header=False)
-    output.seek(0)
-    return output
+    }
+    output = io.BytesIO()
+    write_xlsx(columns, output)
+    return output.getvalue()
 
 @pytest.fixture
-def excel_instance_with_sections(sample_excel_with_sections):
-    """Creates an ExcelFile instance using the in-memory Excel file with multiple sections."""
-    return ExcelFile(sample_excel_with_sections, SECTIONS_CONFIG)
+def sample_excel_with_sections(sample_excel_with_sections_bytes):
+    """Creates an in-memory Excel file with multiple sections, written only once per module."""
+    return io.BytesIO(sample_excel_with_sections_bytes)
+
+@pytest.fixture(scope="module")
+def excel_instance_with_sections(sample_excel_with_sections_bytes):
+    """Creates an ExcelFile instance using the in-memory Excel file with multiple sections.
+
+    Shared by the whole module, so tests must only read from it.
+    """
+    return ExcelFile(io.BytesIO(sample_excel_with_sections_bytes), SECTIONS_CONFIG)
 
 # -------------------------------------------------------------------------------------------
 # Tests for find_row_for_key functionality
 # -------------------------------------------------------------------------------------------
-def test_find_existing_keys_in_sections(excel_instance_with_sections):
+@pytest.mark.parametrize("key, expected_index", [
+    ("Model", 5),
+    ("Osoba odpowiedzialna", 0),
+    ("Numer seryjny terminala", 14)
+])
+def test_find_existing_keys_in_sections(excel_instance_with_sections, key, expected_index):
     """
 Test that find_row_for_key finds the correct row indices for specified keys.
     Verifies that keys present in the file are correctly located.
 """
-    test_cases = {
-        "Model": 5,
-        "Osoba odpowiedzialna": 0,
-        "Numer seryjny terminala": 14
-    }
-    for key, expected_index in test_cases.items():
-        row_index = excel_instance_with_sections.find_row_for_key(key)
-        assert row_index == expected_index, f"Expected {expected_index} for key '{key}', but got {row_index}"
+    row_index = excel_instance_with_sections.find_row_for_key(key)
+    assert row_index == expected_index, f"Expected {expected_index} for key '{key}', but got {row_index}"
 
 def test_find_non_existing_key_in_sections(excel_instance_with_sections):
     """
@@ -169,6 +292,13 @@ Test that find_row_for_key correctly filters match results when the same key app
     row_index = excel_instance_with_sections.find_row_for_key("Imię i nazwisko", "OSOBA ODPOWIEDZIALNA ZA PRZEJĘCIE STACJI PO STRONIE KLIENTA")
     assert row_index == 24, f"Expected index 24 for 'Imię i nazwisko' in the specified section, but got {row_index}"
 
+def test_find_key_in_section_with_whitespace_in_name(excel_instance_with_sections):
+    """
+Test that find_row_for_key ignores whitespace around the section name, the same way as around keys.
+"""
+    row_index = excel_instance_with_sections.find_row_for_key("Imię i nazwisko", " OSOBA ODPOWIEDZIALNA ZA PRZEJĘCIE STACJI PO STRONIE KLIENTA\n")
+    assert row_index == 24, f"Expected index 24 for 'Imię i nazwisko' in the specified section, but got {row_index}"
+
 def test_find_key_in_global_section(excel_instance_with_sections):
     """
 Test that find_row_for_key correctly searches in the global section.
@@ -176,6 +306,31 @@ Test that find_row_for_key correctly searches in the global section.
     row_index = excel_instance_with_sections.find_row_for_key("Numer jobu", "global_data")
     assert row_index == 1, f"Expected index 1 for 'Numer jobu' in global_data, but got {row_index}"
 
+def test_find_key_in_takeover_section_without_configured_names(sample_excel_with_sections):
+    """
+Test that find_row_for_key returns -1 for a duplicated key when the takeover section has no configured names.
+"""
+    sections_config = dict(SECTIONS_CONFIG, SECTION_RESPONSIBLE_PERSON=[])
+    excel = ExcelFile(sample_excel_with_sections, sections_config)
+    row_index = excel.find_row_for_key("Imię i nazwisko", "responsible_person")
+    assert row_index == -1, f"Expected -1 for an unconfigured section, but got {row_index}"
+
+@pytest.mark.parametrize("sections_config, unconfigured_sections", [
+    (None, ["global_data", "contact_person", "responsible_person"]),
+    (dict(SECTIONS_CONFIG, SECTION_STATION_TAKEOVER_DIVIDER=None), ["global_data"]),
+    (dict(SECTIONS_CONFIG, SECTION_CONTACT_PERSON=[None, 1]), ["contact_person"]),
+])
+def test_construct_with_incomplete_sections_config(sample_excel_with_sections, sections_config, unconfigured_sections):
+    """
+Test that a missing config, a None entry or non-string names do not prevent loading the file.
+    Takeover sections without usable names are left out of the template.
+"""
+    excel = ExcelFile(sample_excel_with_sections, sections_config)
+    assert excel.worksheet_count == 1
+    template_structure = excel.create_template_structure()
+    for takeover_key in unconfigured_sections:
+        assert template_structure["takeover"][takeover_key] is None
+
 def test_find_multiple_keys_in_specified_section(excel_instance_with_sections):
     """
     Test that find_row_for_key raises a ValueError 
@@ -223,6 +378,15 @@ Test that repeated keys across sections are handled appropriately.
     assert isinstance(row_index, list), "Expected a list of indices for a duplicated key."
     assert len(row_index) >= 2, f"Expected multiple indices for 'Adres', got {row_index}"
 
+def test_repeated_lookups_return_independent_results(excel_instance_with_sections):
+    """
+Test that modifying the list returned for a duplicated key does not affect later lookups.
+"""
+    first_result = excel_instance_with_sections.find_row_for_key("Adres")
+    first_result.append(-1)
+    second_result = excel_instance_with_sections.find_row_for_key("Adres")
+    assert second_result == first_result[:-1], f"Expected {first_result[:-1]}, but got {second_result}"
+
 def test_section_with_lowercase_header(excel_instance_with_sections):
     """
 Test that _identify_sections ignores headers that are not entirely uppercase.
@@ -416,9 +580,10 @@ def test_compare_structure_with_file(excel_instance_with_sections, standard_temp
     updated_structure = excel_instance_with_sections.compare_structure_with_file(standard_template)
     
     # Check station sections: each key should match the Excel cell based on row index.
+    key_column = excel_instance_with_sections.worksheet.iloc[:, 1].to_numpy()  # Pulled once instead of an iat call per key
     for section, fields in updated_structure["stations"].items():
         for key, row_index in fields.items():
-            cell_value = excel_instance_with_sections.worksheet.iat[row_index, 1]
+            cell_value = key_column[row_index]
             assert cell_value == key, f"Expected key '{key}' at row {row_index} in section '{section}', got '{cell_value}'"
     
     # Check takeover sections.
@@ -457,11 +622,10 @@ def test_compare_structure_no_changes(excel_instance_with_sections, standard_tem
 # -------------------------------------------------------------------------------------------
 # Tests for create_data_structure_from_template
 # -------------------------------------------------------------------------------------------
-@pytest.fixture
-def sample_excel_file(tmp_path):
-    """Creates a temporary test Excel file for create_data_structure_from_template."""
-    file_path = tmp_path / "test_file.xlsx"
-    df = pd.DataFrame({
+@pytest.fixture(scope="session")
+def sample_excel_bytes():
+    """Creates the content of a test Excel file for create_data_structure_from_template, written once per session."""
+    columns = {
         'A': ['Lp', 'SECTION1', 'key1', 'key2', 'SECTION2', 'key3', 'key6', 'SECTION3', 'key5', 'key6', 'SECTION4', 'key7', 'key1', 'SECTION6', 'key9', 'key10'],
         'B': [1, None, 'key1', 'key2', None, 'key3', 'key4', None, 'key5', 'key6', None, 'key7', 'key1', None, 'key9', 'key10'],
         'C': [2, 'value7', 'value8', 'value9', 'value10', 'value11', 'value12', 'value13', 'value14', 'value15', 'value30', 'value31', 'value32', 'value33', 'value34', 'value35'],
@@ -469,9 +633,10 @@ def sample_excel_file(tmp_path):
         'E': [4, 'value7', 'value69', 'value9', 'value10', 'value11', 'value12', 'value51', 'value51', 'value15', 'value19', 'value20', 'value21', 'value22', 'value23', 'value24'],
         'F': [5, 'value7', 'value8', 'value69', 'value11', 'value10', 'value12', 'value3', 'value53', 'value35', 'value22', 'value23', 'value24', 'value25', 'value26', 'value27'],
         'G': [6, 'value7', 'value8', 'value9', 'value10', 'value11', 'value12', 'value13', 'value14', 'value15', 'value25', 'value26', 'value27', 'value28', 'value29', 'value30'],
-    })
-    df.to_excel(file_path, index=False, header=False)
-    return file_path
+    }
+    output = io.BytesIO()
+    write_xlsx(columns, output)
+    return output.getvalue()
 
 @pytest.fixture
 def sample_template():
@@ -488,10 +653,9 @@ def sample_template():
         }
     }
 
-def test_create_data_structure_from_template(sample_excel_file, sample_template):
+def test_create_data_structure_from_template(sample_excel_bytes, sample_template):
     """Test that create_data_structure_from_template returns the expected data structure."""
-    with open(sample_excel_file, "rb") as f:
-        file_stream = io.BytesIO(f.read())
+    file_stream = io.BytesIO(sample_excel_bytes)
     sections_config = {
         "SECTION_STATION_TAKEOVER_DIVIDER": ["SECTION1"],
         "SECTION_CONTACT_PERSON": ["SECTION2"],
@@ -532,20 +696,20 @@ def test_create_data_structure_from_template(sample_excel_file, sample_template)
 # -------------------------------------------------------------------------------------------
 # Tests for create_data_structure_from_template
 # -------------------------------------------------------------------------------------------
-@pytest.fixture
-def sample_excel_file_with_none_columns(tmp_path):
-    """Creates a temporary test Excel file with columns containing all None values."""
-    file_path = tmp_path / "test_file_with_none_columns.xlsx"
-    df = pd.DataFrame({
+@pytest.fixture(scope="session")
+def sample_excel_bytes_with_none_columns():
+    """Creates the content of a test Excel file with columns containing all None values."""
+    columns = {
         'A': ['Lp', 'SECTION1', 'key1', 'key2', 'SECTION2', 'key3', 'key4'],
         'B': [1, None, 'key1', 'key2', None, 'key3', 'key4'],
         'C': [None, None, None, None, None, None, None],  # All None column
         'D': [2, 'value1', 'value2', 'value3', 'value4', 'value5', 'value6'],
         'E': [None, None, None, None, None, None, None],  # All None column
         'F': [3, 'value7', 'value8', 'value9', 'value10', 'value11', 'value12']
-    })
-    df.to_excel(file_path, index=False, header=False)
-    return file_path
+    }
+    output = io.BytesIO()
+    write_xlsx(columns, output)
+    return output.getvalue()
 
 @pytest.fixture
 def sample_template_with_none_columns():
@@ -562,10 +726,9 @@ def sample_template_with_none_columns():
         }
     }
 
-def test_create_data_structure_from_template_with_none_columns(sample_excel_file_with_none_columns, sample_template_with_none_columns):
+def test_create_data_structure_from_template_with_none_columns(sample_excel_bytes_with_none_columns, sample_template_with_none_columns):
     """Test that create_data_structure_from_template skips columns where all values are None."""
-    with open(sample_excel_file_with_none_columns, "rb") as f:
-        file_stream = io.BytesIO(f.read())
+    file_stream = io.BytesIO(sample_excel_bytes_with_none_columns)
     sections_config = {
         "SECTION_STATION_TAKEOVER_DIVIDER": ["SECTION1"],
         "SECTION_CONTACT_PERSON": ["SECTION2"]
@@ -592,6 +755,34 @@ def test_create_data_structure_from_template_with_none_columns(sample_excel_file
     assert data_structure[1]["stations"][0]["SECTION1"] == {"key1": "value8", "key2": "value9"}
     assert data_structure[1]["stations"][0]["SECTION2"] == {"key3": "value11", "key4": "value12"}
 
+def test_create_data_structure_groups_columns_with_empty_global_values():
+    """Test that numeric columns whose global data has the same empty cells end up in the same group."""
+    columns = {
+        'A': ['Lp', 'SECTION1', 'key1', 'key2', 'SECTION2', 'key3'],
+        'B': [1, None, 'key1', 'key2', None, 'key3'],
+        'C': [2, 10, 20, None, 40, 50],
+        'D': [3, 10, 20, None, 40, 60]
+    }
+    file_stream = io.BytesIO()
+    write_xlsx(columns, file_stream)
+    template = {
+        "takeover": {
+            "global_data": {"key1": 1, "key2": 2},
+            "contact_person": None,
+            "responsible_person": None
+        },
+        "stations": {
+            "SECTION2": {"key3": 4}
+        }
+    }
+    excel_file = ExcelFile(file_stream, {"SECTION_STATION_TAKEOVER_DIVIDER": ["SECTION1"]})
+    data_structure = excel_file.create_data_structure_from_template(template)
+
+    assert len(data_structure) == 1
+    assert len(data_structure[0]["stations"]) == 2
+    assert data_structure[0]["stations"][0]["SECTION2"] == {"key3": 50}
+    assert data_structure[0]["stations"][1]["SECTION2"] == {"key3": 60}
+
 # -------------------------------------------------------------------------------------------
 # Tests for terminal
 # -------------------------------------------------------------------------------------------
@@ -1,7 +1,7 @@
 import pytest
 import io
 import os
-from excel_lib import file_to_io_stream, is_match
+from excel_lib import file_to_io_stream, is_match, normalize_key
 
 @pytest.fixture
 def sample_file(tmp_path):
@@ -22,27 +22,33 @@ def test_file_to_io_stream_non_existent():
     with pytest.raises(FileNotFoundError):
         file_to_io_stream("non_existent_file.txt")
 
-def test_is_match_identical_strings():
-    """Checks if the function correctly compares identical strings"""
-    assert is_match("Test", "Test") is True
-    assert is_match("123", "123") is True
-
-def test_is_match_whitespace_handling():
-    """Checks if the function ignores whitespace"""
-    assert is_match(" Test ", "Test") is True
-    assert is_match("\tHello\n", "Hello") is True
-
-def test_is_match_different_strings():
-    """Checks if the function correctly detects different values"""
-    assert is_match("Test", "test") is False
-    assert is_match("123", "124") is False
-
-def test_is_match_numbers():
-    """Checks if numbers are correctly compared"""
-    assert is_match(5, 5) is True
-    assert is_match(5, 10) is False
-
-def test_is_match_different_types():
-    """Checks if different types return False"""
-    assert is_match(5, "5") is False
-    assert is_match(3.14, "3.14") is False
+@pytest.mark.parametrize("value1, value2, expected", [
+    ("Test", "Test", True),  # identical strings
+    ("123", "123", True),
+    (" Test ", "Test", True),  # whitespace is ignored
+    ("\tHello\n", "Hello", True),
+    ("Test", "test", False),  # different strings
+    ("123", "124", False),
+    (5, 5, True),  # numbers
+    (5, 10, False),
+    (5, "5", False),  # different types
+    (3.14, "3.14", False),
+])
+def test_is_match(value1, value2, expected):
+    """Checks if the function compares values, ignoring whitespace around strings only"""
+    assert is_match(value1, value2) is expected
+
+def test_normalize_key_strips_strings():
+    """Checks if string keys are stripped of surrounding whitespace"""
+    assert normalize_key(" Model ") == "Model"
+    assert normalize_key("\tHello\n") == "Hello"
+
+def test_normalize_key_keeps_other_values():
+    """Checks if non-string keys are returned unchanged"""
+    assert normalize_key(5) == 5
+    assert normalize_key(3.14) == 3.14
+
+def test_normalize_key_agrees_with_is_match():
+    """Checks if values matched by is_match have equal normalized forms"""
+    for value1, value2 in [(" Test ", "Test"), ("Test", "test"), (5, 5), (5, "5")]:
+        assert (normalize_key(value1) == normalize_key(value2)) is is_match(value1, value2)